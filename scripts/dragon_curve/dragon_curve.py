@@ -6,11 +6,16 @@ Generate a dragon curve
 
 """
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 from PIL import Image
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+from profiling import StageProfiler
+
 
 fpath = "../../fonts/tex-gyre-adventor/texgyreadventor-regular.otf"
 prop = fm.FontProperties(fname=fpath)
@@ -45,20 +50,25 @@ col1 = "#04D9D9"
 col2 = "#F241A3"
 
 np.random.seed(3)
+profiler = StageProfiler()  # Enabled with MATHART_PROFILE=1
 
 A = 0.5*np.array([
 [1, -1],
 [1, 1]])
 
-plt.figure(figsize=(6,6))
+fig = plt.figure(figsize=(6,6))
+fig.draw = profiler.wrap(fig.draw, "draw")  # Rendering of the figure
 x0 = np.random.normal(0, 1, 2)
 niter = 15000
 files = []
 for cont in range(niter):
-    x1 = A @ x0
-    x2 = A @ x0 + np.array([1, 0])
-    plt.plot(*x1.T, ".", alpha=0.4, color=col1, mec=None, mfc=col1, markersize=2)
-    plt.plot(*x2.T, ".", alpha=0.4, color=col2, mec=None, mfc=col2, markersize=2)
+    frame = len(files)  # Image where this iteration is saved
+    with profiler.stage("compute", frame=frame):
+        x1 = A @ x0
+        x2 = A @ x0 + np.array([1, 0])
+    with profiler.stage("draw", frame=frame):
+        plt.plot(*x1.T, ".", alpha=0.4, color=col1, mec=None, mfc=col1, markersize=2)
+        plt.plot(*x2.T, ".", alpha=0.4, color=col2, mec=None, mfc=col2, markersize=2)
     pick = np.random.randint(0, 2)
     if pick:
         x0 = x1.copy()
@@ -74,7 +84,8 @@ for cont in range(niter):
         plt.text(1.75, -0.9, "@nicoguaro", fontsize=14,
                      horizontalalignment='right',
                      fontproperties=prop)
-        plt.savefig(file, dpi=300)
+        with profiler.stage("encode", frame=frame):
+            plt.savefig(file, dpi=300)
         files.append(file)
 
 
@@ -82,6 +93,8 @@ for cont in range(niter):
 
 # plt.show()
 
-save_gif_PIL("dragon_curve.gif", files, fps=5, loop=0)
+with profiler.stage("encode"):
+    save_gif_PIL("dragon_curve.gif", files, fps=5, loop=0)
+profiler.report("dragon_curve_trace.json")
 
 [os.remove(file) for file in files]
\ No newline at end of file
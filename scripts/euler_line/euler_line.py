@@ -6,11 +6,16 @@ Animate the Euler line for random triangles.
 @author: Nicolás Guarín-Zapata
 """
 import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import matplotlib.font_manager as fm
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+from profiling import StageProfiler
+
 fpath = "../../fonts/tex-gyre-adventor/texgyreadventor-regular.otf"
 prop = fm.FontProperties(fname=fpath)
 
@@ -31,18 +36,22 @@ def plot_tri(ang, ax=None):
     return ax
 
 
-def plot_pts(ang, ax=None):
-    if ax is None:
-        ax = plt.gca()
+def triangle_angles(cont):
+    """Angles of the vertices of the triangle for the frame ``cont``"""
+    t = np.linspace(0, 2*np.pi)[cont]
+    ang0 = -0.5 + np.pi*np.sin(2*t)/18
+    ang1 = 1.5 + np.pi*np.sin(3*t)/18
+    ang2 = 4 + np.pi*np.sin(5*t)/18
+    return np.array([ang0, ang1, ang2])
+
+
+def triangle_centers(ang):
+    """Centroid and orthocenter of a triangle inscribed in the unit circle"""
     x = np.cos(ang)
     y = np.sin(ang)
     # Centroid
     cent_x = np.sum(x)/3
     cent_y = np.sum(y)/3
-    ax.plot(cent_x, cent_y, marker="o", zorder=5, mec="#333333")
-
-    # Circumcenter
-    ax.plot(0, 0, marker="o", zorder=5, mec="#333333")
 
     # Orthocenter
     side0 = np.sqrt((x[2] - x[1])**2 + (y[2] - y[1])**2)
@@ -55,6 +64,20 @@ def plot_pts(ang, ax=None):
              / (np.tan(ang0) + np.tan(ang1) + np.tan(ang2))
     ortho_y = (y[0]*np.tan(ang0) + y[1]*np.tan(ang1) + y[2]*np.tan(ang2))\
              / (np.tan(ang0) + np.tan(ang1) + np.tan(ang2))
+    return (cent_x, cent_y), (ortho_x, ortho_y)
+
+
+def plot_pts(ang, ax=None):
+    if ax is None:
+        ax = plt.gca()
+    (cent_x, cent_y), (ortho_x, ortho_y) = triangle_centers(ang)
+    # Centroid
+    ax.plot(cent_x, cent_y, marker="o", zorder=5, mec="#333333")
+
+    # Circumcenter
+    ax.plot(0, 0, marker="o", zorder=5, mec="#333333")
+
+    # Orthocenter
     ax.plot(ortho_x, ortho_y, marker="o", zorder=5, mec="#333333")
     return ax
 
@@ -62,10 +85,7 @@ def plot_pts(ang, ax=None):
 def plot_euler_line(ang, ax=None):
     if ax is None:
         ax = plt.gca()
-    x = np.cos(ang)
-    y = np.sin(ang)
-    cent_x = np.sum(x)/3
-    cent_y = np.sum(y)/3
+    (cent_x, cent_y), _ = triangle_centers(ang)
     angle_euler = np.arctan2(cent_y, cent_x)
     ax.plot([-1.2*np.cos(angle_euler), 1.2*np.cos(angle_euler)],
              [-1.2*np.sin(angle_euler), 1.2*np.sin(angle_euler)], zorder=4)
@@ -76,11 +96,7 @@ def update(cont):
     """Update the axes for the new frame"""
     plt.cla()
 
-    t = np.linspace(0, 2*np.pi)[cont]
-    ang0 = -0.5 + np.pi*np.sin(2*t)/18
-    ang1 = 1.5 + np.pi*np.sin(3*t)/18
-    ang2 = 4 + np.pi*np.sin(5*t)/18
-    ang = np.array([ang0, ang1, ang2])
+    ang = triangle_angles(cont)
     plot_tri(ang)
     plot_pts(ang)
     plot_euler_line(ang)
@@ -95,13 +111,28 @@ def update(cont):
     return None
 
 
+def init():
+    """Initial frame, left empty so that ``update`` draws every frame"""
+    return []
+
+
 if __name__ == "__main__":
     repo = "https://raw.githubusercontent.com/nicoguaro/matplotlib_styles/master"
     style = repo + "/styles/neon.mplstyle"
     plt.style.use(style)
 
+    # Profiling (enabled with MATHART_PROFILE=1)
+    profiler = StageProfiler()
+    triangle_angles = profiler.wrap(triangle_angles, "compute")
+    triangle_centers = profiler.wrap(triangle_centers, "compute")
+    update = profiler.wrap(update, "draw", frame_arg=0)
+
     # Animation
     fig = plt.figure(figsize=(4, 4))
-    ani = animation.FuncAnimation(fig, update, range(0, 50), repeat=False)
-    ani.save("euler_line.gif", writer='imagemagick', dpi=300)
+    fig.draw = profiler.wrap(fig.draw, "draw")  # Rendering of the frame
+    ani = animation.FuncAnimation(fig, update, range(0, 50), repeat=False,
+                                  init_func=init)
+    with profiler.stage("encode"):
+        ani.save("euler_line.gif", writer='imagemagick', dpi=300)
+    profiler.report("euler_line_trace.json")
     plt.show()
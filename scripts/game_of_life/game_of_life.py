@@ -32,11 +32,17 @@ generations.
 
 @author: Nicolás Guarín-Zapata
 """
+import os
+import sys
 import numpy as np
 from numpy.random import randint
 from matplotlib import pyplot as plt
 import matplotlib.animation as animation
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+from profiling import StageProfiler
+
 
 def automata_step(A):
     """
@@ -72,6 +78,11 @@ def update(step, A, verbose=False):
     plt.axis('off')
     return None
 
+
+def init():
+    """Initial frame, left empty so that ``update`` draws every step"""
+    return []
+
 #%%
 if __name__ == "__main__":
     plt.rcParams["image.cmap"] = "bone_r"
@@ -86,9 +97,17 @@ if __name__ == "__main__":
       n//2 - m//2:n//2 + m//2] = randint(0, 2, (m,m))
     
 
+    # Profiling (enabled with MATHART_PROFILE=1)
+    profiler = StageProfiler()
+    automata_step = profiler.wrap(automata_step, "compute")
+    update = profiler.wrap(update, "draw", frame_arg=0)
+
     # Animation
     fig = plt.figure(figsize=(5, 5))
+    fig.draw = profiler.wrap(fig.draw, "draw")  # Rendering of the frame
     ani = animation.FuncAnimation(fig, update, range(nsteps),repeat=False,
-                                  fargs=(A,))
-    ani.save("game_of_life.gif", writer='imagemagick', dpi=100)
+                                  init_func=init, fargs=(A,))
+    with profiler.stage("encode"):
+        ani.save("game_of_life.gif", writer='imagemagick', dpi=100)
+    profiler.report("game_of_life_trace.json")
     plt.show()
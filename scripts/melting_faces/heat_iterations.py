@@ -7,73 +7,163 @@ Based on: https://commons.wikimedia.org/wiki/File:Heat_eqn.gif
 
 @author: Nicolás Guarín-Zapata
 """
+import os
+import sys
 import numpy as np
 from scipy.ndimage import gaussian_filter
 from mayavi import mlab
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+from profiling import StageProfiler
 
-def step_function(N, scale, X, Y, shape="crescent"):
-    """Function that is 1 on a set and 0 outside of it"""
-    shapes = ["crescent", "cylinder", "hexagon", "superquadric", "smiley",
-              "heart"]
-
-    if shape not in shapes:
-        shape = "crescent"
-
-    if shape == "cylinder":
-        Z = np.ones_like(X)
-        Z[X**2 + Y**2 < 0.5] = 0
-        Z[X**2 + Y**2 > 2] = 0
-
-    if shape == "superquadric":
-        Z = np.ones_like(X)
-        Z[np.abs(X)**0.5 + np.abs(Y)**0.5 > 1.5] = 0
-
-    if shape == "hexagon":
-        Z = np.ones_like(X)
-        hexa = 2*np.abs(X) + np.abs(X - Y*np.sqrt(3)) +\
-            np.abs(X + Y*np.sqrt(3))
-        Z[hexa > 6] = 0
-
-    if shape == "crescent":
-        c = 2
-        d = -1
-        e = 1
-        f = 0.5
-        k = 1.2
-        shift = 10
-        Z = (c**2 - (X/e - d)**2 - (Y/f)**2)**2 + k*(c + d - X/e)**3 - shift
-        Z = 1 - np.maximum(np.sign(Z), 0)
-
-    if shape == "smiley":
-        Z = np.ones_like(X)
-        fac = 1.2
-        x_eye = 0.5
-        y_eye = 0.4
-        bicorn = fac**2*(Y + 0.3)**2*(1 - fac**2*X**2) -\
-                (fac**2*X**2 - 2*fac*(Y + 0.3) - 1)**2
-        left_eye = (X + x_eye)**2/0.1 + (Y - y_eye)**2/0.4 - 1
-        right_eye = (X - x_eye)**2/0.1 + (Y - y_eye)**2/0.4 - 1
-        Z[X**2 + Y**2 > 2] = 0
-        Z[bicorn > 0] = 0
-        Z[left_eye < 0] = 0
-        Z[right_eye < 0] = 0
-
-    if shape == "heart":
-        # From http://mathworld.wolfram.com/HeartCurve.html
-        offset = 0.8
-        size = 0.6
-        Z = np.ones_like(X)
-        T = np.arctan2(Y/size - offset/size, X/size)
-        R = np.sqrt(X**2 + (Y - offset)**2)/size
-        curve = R - 2 + 2*np.sin(T) - np.sin(T)*np.sqrt(np.abs(np.cos(T)))/(np.sin(T) + 1.4)
-        Z[curve > 0] = 0
-
-    Z = scale * Z
-    Z = gaussian_filter(Z, sigma=3)
+
+def crescent(X, Y):
+    """Indicator function of a crescent"""
+    c = 2
+    d = -1
+    e = 1
+    f = 0.5
+    k = 1.2
+    shift = 10
+    Z = (c**2 - (X/e - d)**2 - (Y/f)**2)**2 + k*(c + d - X/e)**3 - shift
+    return 1 - np.maximum(np.sign(Z), 0)
+
+
+def cylinder(X, Y):
+    """Indicator function of an annulus"""
+    Z = np.ones_like(X)
+    Z[X**2 + Y**2 < 0.5] = 0
+    Z[X**2 + Y**2 > 2] = 0
+    return Z
+
+
+def hexagon(X, Y):
+    """Indicator function of a hexagon"""
+    Z = np.ones_like(X)
+    hexa = 2*np.abs(X) + np.abs(X - Y*np.sqrt(3)) +\
+        np.abs(X + Y*np.sqrt(3))
+    Z[hexa > 6] = 0
+    return Z
+
+
+def superquadric(X, Y):
+    """Indicator function of a superquadric"""
+    Z = np.ones_like(X)
+    Z[np.abs(X)**0.5 + np.abs(Y)**0.5 > 1.5] = 0
     return Z
 
 
+def smiley(X, Y):
+    """Indicator function of a smiley face"""
+    Z = np.ones_like(X)
+    fac = 1.2
+    x_eye = 0.5
+    y_eye = 0.4
+    bicorn = fac**2*(Y + 0.3)**2*(1 - fac**2*X**2) -\
+            (fac**2*X**2 - 2*fac*(Y + 0.3) - 1)**2
+    left_eye = (X + x_eye)**2/0.1 + (Y - y_eye)**2/0.4 - 1
+    right_eye = (X - x_eye)**2/0.1 + (Y - y_eye)**2/0.4 - 1
+    Z[X**2 + Y**2 > 2] = 0
+    Z[bicorn > 0] = 0
+    Z[left_eye < 0] = 0
+    Z[right_eye < 0] = 0
+    return Z
+
+
+def heart(X, Y):
+    """Indicator function of a heart"""
+    # From http://mathworld.wolfram.com/HeartCurve.html
+    offset = 0.8
+    size = 0.6
+    Z = np.ones_like(X)
+    T = np.arctan2(Y/size - offset/size, X/size)
+    R = np.sqrt(X**2 + (Y - offset)**2)/size
+    curve = R - 2 + 2*np.sin(T) - np.sin(T)*np.sqrt(np.abs(np.cos(T)))/(np.sin(T) + 1.4)
+    Z[curve > 0] = 0
+    return Z
+
+
+SHAPES = {"crescent": crescent,
+          "cylinder": cylinder,
+          "hexagon": hexagon,
+          "superquadric": superquadric,
+          "smiley": smiley,
+          "heart": heart}
+_smoothed = {}
+
+
+def register_shape(name, sdf):
+    """Add a shape given by a signed distance function
+
+    Parameters
+    ----------
+    name : str
+        Name of the shape.
+    sdf : callable
+        Function of (X, Y) that is negative inside the shape and
+        positive outside of it.
+    """
+    SHAPES[name] = lambda X, Y: (sdf(X, Y) <= 0).astype(float)
+    for key in [key for key in _smoothed if key[0] == name]:
+        del _smoothed[key]
+
+
+def smooth_shapes(shapes, Ns, L):
+    """Rasterize and smooth the shapes for every resolution
+
+    The shapes are smoothed with a Gaussian filter (sigma=3). All the
+    shapes with the same resolution are filtered together and the
+    results are stored by (shape, N, L).
+
+    Parameters
+    ----------
+    shapes : list
+        Names of the shapes in ``SHAPES``.
+    Ns : list
+        Number of grid points per side.
+    L : float
+        Half the size of the box.
+
+    Returns
+    -------
+    fields : dict
+        Smoothed shapes with (shape, N, L) as keys and unit height.
+    """
+    if isinstance(shapes, str) or isinstance(Ns, (str, int, np.integer)):
+        raise TypeError("shapes and Ns should be lists, e.g., "
+                        "smooth_shapes(['heart'], [500], L)")
+    for shape in shapes:
+        if shape not in SHAPES:
+            raise ValueError("Unknown shape '%s'. Options are: %s"
+                             % (shape, ", ".join(SHAPES)))
+    fields = {}
+    for N in Ns:
+        missing = [shape for shape in shapes
+                   if (shape, N, L) not in _smoothed]
+        if missing:
+            X, Y = np.mgrid[-L:L:N*1j, -L:L:N*1j]
+            Z = np.stack([SHAPES[shape](X, Y) for shape in missing])
+            Z = gaussian_filter(Z, sigma=(0, 3, 3))
+            # Copies, so that each shape can be evicted on its own
+            for shape, Z_shape in zip(missing, Z):
+                Z_shape = Z_shape.copy()
+                Z_shape.flags.writeable = False
+                _smoothed[shape, N, L] = Z_shape
+        for shape in shapes:
+            fields[shape, N, L] = _smoothed[shape, N, L]
+    return fields
+
+
+def step_function(N, scale, L, shape="crescent"):
+    """Smoothed function that is scale on a set and 0 outside of it
+
+    The grid is ``np.mgrid[-L:L:N*1j, -L:L:N*1j]``.
+    """
+    Z = smooth_shapes([shape], [N], L)[shape, N, L]
+    return scale * Z
+
+
 def data_gen(num):
     # Solve the heat equation with zero boundary conditions
     for cont in range(ntime_anim):
@@ -88,7 +178,7 @@ if __name__ == "__main__":
     L = 2.5  # Box size
     X, Y = np.mgrid[-L:L:N*1j, -L:L:N*1j]
     scale = 2
-    Z = step_function(N, scale, X, Y, shape="heart")
+    Z = step_function(N, scale, L, shape="heart")
     CFL = 0.125
     dx = X[1, 0] - X[0, 0]
     dy = dx
@@ -100,6 +190,8 @@ if __name__ == "__main__":
     ntime_anim = int(ntime/nframes)
     savefigs = True
     fname = "heat_iter"
+    profiler = StageProfiler()  # Enabled with MATHART_PROFILE=1
+    data_gen = profiler.wrap(data_gen, "compute", frame_arg=0)
 
     #%% Visualization
     fig = mlab.figure(size=(1000, 800))
@@ -126,11 +218,14 @@ if __name__ == "__main__":
     def anim():
         for cont in range(nframes):
             data_gen(cont)
-            surf.mlab_source.scalars = Z
+            with profiler.stage("draw", frame=cont):
+                surf.mlab_source.scalars = Z
             if savefigs:
                 print(cont)
-                mlab.savefig("{}_{n:03d}.png".format(fname, n=cont))
+                with profiler.stage("encode", frame=cont):
+                    mlab.savefig("{}_{n:03d}.png".format(fname, n=cont))
             yield
+        profiler.report(fname + "_trace.json")
 
     anim()
     mlab.show()
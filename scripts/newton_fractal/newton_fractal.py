@@ -10,9 +10,15 @@ of vectorization of the operations.
 @author: Nicolás Guarín-Zapata
 """
 
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+from profiling import StageProfiler
+
 
 def newt(x, fun, der, tol=1e-5, niter=100):
     """ Find a root using Newton Method"""
@@ -62,12 +68,18 @@ colors = [[0.0431, 0.4078, 0.6588],
           [0.2, 0.2, 0.2]]
 fun = lambda x: x*x*x + 1.0
 der = lambda x: 3.0*x*x
-col_newt = img_newt(2000, tol=1e-10, niter=1000)
+profiler = StageProfiler()  # Enabled with MATHART_PROFILE=1
+with profiler.stage("compute"):
+    col_newt = img_newt(2000, tol=1e-10, niter=1000)
 
 #%% Visualization
-plt.figure(figsize=(4,4))
-plt.imshow(col_newt, extent=(-3, 3, -3, 3), origin='lower')
-plt.axis('off')
-plt.savefig('newton_fractal.png', dpi=500, transparent=True,
-            bbox_inches='tight', pad_inches=0)
+with profiler.stage("draw"):
+    fig = plt.figure(figsize=(4,4))
+    fig.draw = profiler.wrap(fig.draw, "draw")  # Rendering of the figure
+    plt.imshow(col_newt, extent=(-3, 3, -3, 3), origin='lower')
+    plt.axis('off')
+with profiler.stage("encode"):
+    plt.savefig('newton_fractal.png', dpi=500, transparent=True,
+                bbox_inches='tight', pad_inches=0)
+profiler.report("newton_fractal_trace.json")
 plt.show()
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in per-stage profiling for the animation scripts.
+
+The stages of a render (compute, draw and encode) are timed separately
+for every frame. For each stage we record wall time, CPU time, the net
+memory allocated and the peak memory above the level at the start of
+the stage (using ``tracemalloc``). Stages can be nested, e.g.,
+``ani.save`` (encode) calls ``fig.draw`` (draw) to render each frame;
+the time and memory reported for each stage exclude the ones of its
+children.
+
+The profiler is activated with the environment variable
+``MATHART_PROFILE``, for example::
+
+    MATHART_PROFILE=1 python game_of_life.py
+
+The time the profiler spends on its own bookkeeping is not reported as
+time of any stage; in the trace it shows up as "profiler" events.
+
+When it is not active, ``stage`` returns a shared no-op context manager
+and ``wrap`` returns the function untouched, so the scripts run as
+before.
+
+@author: Nicolás Guarín-Zapata
+"""
+import os
+import sys
+import json
+import time
+import tracemalloc
+from functools import wraps
+
+
+class _NullStage:
+    """Context manager that does nothing"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Context manager that measures one stage of the pipeline"""
+    def __init__(self, profiler, name, frame):
+        # The bookkeeping of the profiler starts here
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.profiler = profiler
+        self.name = name
+        self.frame = frame
+
+    def __enter__(self):
+        self.profiler._push(self.name, self.frame, self.wall, self.cpu)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._pop()
+        return False
+
+
+class StageProfiler:
+    """Record the time and memory of each stage of a render
+
+    Parameters
+    ----------
+    enabled : bool (optional)
+        Turn the profiler on. If not given, it is read from the
+        environment variable ``MATHART_PROFILE``.
+    track_alloc : bool (optional)
+        Measure the net and peak memory allocated in each stage using
+        ``tracemalloc``. It needs Python 3.9 or newer.
+    """
+    def __init__(self, enabled=None, track_alloc=True):
+        if enabled is None:
+            enabled = os.environ.get("MATHART_PROFILE", "") not in ("", "0")
+        self.enabled = enabled
+        self.track_alloc = enabled and track_alloc \
+                           and hasattr(tracemalloc, "reset_peak")
+        self.records = []
+        self._stack = []
+        self._frame = None
+        self._origin = time.perf_counter()
+        if self.track_alloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, frame=None):
+        """Context manager that measures the stage ``name``
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage, e.g., "compute", "draw" or "encode".
+        frame : int (optional)
+            Frame number. If not given, the frame of the enclosing
+            stage is used.
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, frame)
+
+    def wrap(self, fun, name, frame_arg=None):
+        """Return a version of ``fun`` that is measured as ``name``
+
+        Parameters
+        ----------
+        fun : callable
+            Function to measure.
+        name : str
+            Name of the stage.
+        frame_arg : int (optional)
+            Position of the argument of ``fun`` with the frame number.
+
+        Returns
+        -------
+        fun : callable
+            The measured function, or ``fun`` itself if the profiler
+            is not enabled.
+        """
+        if not self.enabled:
+            return fun
+
+        @wraps(fun)
+        def wrapped(*args, **kwargs):
+            frame = args[frame_arg] if frame_arg is not None else None
+            with _Stage(self, name, frame):
+                return fun(*args, **kwargs)
+        return wrapped
+
+    def _memory(self):
+        if not self.track_alloc:
+            return 0, 0
+        return tracemalloc.get_traced_memory()
+
+    def _fold(self, record):
+        """Discount the bookkeeping of the children after they ended"""
+        for child in record["children"]:
+            tail = child["mem2"] - child["mem1"]
+            record["child_wall"] += child["wall2"] - child["wall1"]
+            record["child_cpu"] += child["cpu2"] - child["cpu1"]
+            record["child_bytes"] += tail
+            record["child_overhead_bytes"] += tail
+        del record["children"][:]
+
+    def _push(self, name, frame, wall, cpu):
+        if self._stack:
+            self._fold(self._stack[-1])
+        mem, peak = self._memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"],
+                                 peak - parent["child_overhead_bytes"])
+            if frame is None:
+                frame = parent["frame"]
+            if frame is None:
+                frame = self._frame
+        if frame is not None:
+            self._frame = frame
+        # All the keys are created here, so that filling them in does
+        # not allocate inside the stage
+        record = {"name": name, "frame": frame,
+                  "depth": len(self._stack),
+                  "child_wall": 0.0, "child_cpu": 0.0, "child_bytes": 0,
+                  "child_overhead_bytes": 0, "children": [],
+                  "push_wall": wall, "push_cpu": cpu, "push_mem": mem,
+                  "mem0": 0, "peak": 0, "cpu0": 0.0, "wall0": 0.0,
+                  "wall1": 0.0, "cpu1": 0.0, "mem1": 0,
+                  "wall2": 0.0, "cpu2": 0.0, "mem2": 0}
+        self._stack.append(record)
+        if self.track_alloc:
+            tracemalloc.reset_peak()
+        record["cpu0"] = time.process_time()
+        record["mem0"], record["peak"] = self._memory()
+        record["wall0"] = time.perf_counter()
+
+    def _pop(self):
+        wall1 = time.perf_counter()
+        cpu1 = time.process_time()
+        mem1, peak1 = self._memory()
+        record = self._stack.pop()
+        record["wall1"], record["cpu1"], record["mem1"] = wall1, cpu1, mem1
+        mem0 = record["mem0"]
+        record["wall"] = wall1 - record["wall0"]
+        record["cpu"] = cpu1 - record["cpu0"]
+        record["bytes"] = mem1 - mem0
+        record["peak"] = max(record["peak"],
+                             peak1 - record["child_overhead_bytes"]) - mem0
+        self._fold(record)
+        del record["children"]
+        self.records.append(record)
+        if self._stack:
+            # The bookkeeping of this stage falls inside the parent
+            # stage, so it is discounted from it as well
+            parent = self._stack[-1]
+            parent["peak"] = max(parent["peak"],
+                                 record["push_mem"] + record["peak"]
+                                 - parent["child_overhead_bytes"])
+            if self.track_alloc:
+                tracemalloc.reset_peak()
+            overhead_bytes = mem0 - record["push_mem"]
+            parent["child_wall"] += record["wall"] + record["wall0"] \
+                                  - record["push_wall"]
+            parent["child_cpu"] += record["cpu"] + record["cpu0"] \
+                                 - record["push_cpu"]
+            parent["child_bytes"] += record["bytes"] + overhead_bytes
+            parent["child_overhead_bytes"] += \
+                record["child_overhead_bytes"] + overhead_bytes
+            parent["children"].append(record)
+        # Measured last, so that they cover the bookkeeping above. They
+        # are discounted from the parent when it ends
+        record["mem2"] = self._memory()[0]
+        record["cpu2"] = time.process_time()
+        record["wall2"] = time.perf_counter()
+
+    def summary(self):
+        """Table with the self time and memory of each stage
+
+        Returns
+        -------
+        table : str
+            One row per stage, with the number of calls, the total and
+            mean wall time, the CPU time, the net memory allocated and
+            the largest peak memory of a call (if they are tracked).
+        """
+        stages = {}
+        for record in self.records:
+            stats = stages.setdefault(record["name"],
+                                      {"calls": 0, "frames": set(),
+                                       "wall": 0.0, "cpu": 0.0,
+                                       "bytes": 0, "peak": 0})
+            stats["calls"] += 1
+            stats["frames"].add(record["frame"])
+            stats["wall"] += record["wall"] - record["child_wall"]
+            stats["cpu"] += record["cpu"] - record["child_cpu"]
+            stats["bytes"] += record["bytes"] - record["child_bytes"]
+            stats["peak"] = max(stats["peak"], record["peak"])
+
+        total = sum(stats["wall"] for stats in stages.values()) or 1.0
+        header = "{:<10} {:>7} {:>7} {:>11} {:>11} {:>11} {:>7} {:>11} {:>11}"
+        row = "{:<10} {:>7d} {:>7d} {:>11.4f} {:>11.4f} {:>11.4f} {:>6.1f}% {:>11} {:>11}"
+        lines = [header.format("stage", "calls", "frames", "wall [s]",
+                               "wall/frame", "cpu [s]", "share",
+                               "net [KiB]", "peak [KiB]")]
+        for name, stats in sorted(stages.items(),
+                                  key=lambda item: -item[1]["wall"]):
+            nframes = len(stats["frames"] - {None}) or 1
+            if self.track_alloc:
+                net = "%.1f" % (stats["bytes"]/1024)
+                peak = "%.1f" % (stats["peak"]/1024)
+            else:
+                net = peak = "-"
+            lines.append(row.format(name, stats["calls"], nframes,
+                                    stats["wall"], stats["wall"]/nframes,
+                                    stats["cpu"],
+                                    100*stats["wall"]/total,
+                                    net, peak))
+        return "\n".join(lines)
+
+    def save_trace(self, fname):
+        """Write the records in the Chrome trace format
+
+        The file can be opened in ``chrome://tracing`` or Perfetto.
+        The bookkeeping of the profiler is written as "profiler"
+        events, so the self time of each stage matches the summary.
+
+        Parameters
+        ----------
+        fname : string
+            Path to the output file.
+        """
+        pid = os.getpid()
+        events = []
+        for record in self.records:
+            args = {"self_cpu_ms": 1e3*(record["cpu"] - record["child_cpu"])}
+            if self.track_alloc:
+                args["net_kib"] = (record["bytes"]
+                                   - record["child_bytes"])/1024
+                args["peak_kib"] = record["peak"]/1024
+            if record["frame"] is not None:
+                args["frame"] = record["frame"]
+            events.append({"name": record["name"],
+                           "cat": "mathart",
+                           "ph": "X",
+                           "ts": 1e6*(record["wall0"] - self._origin),
+                           "dur": 1e6*record["wall"],
+                           "pid": pid,
+                           "tid": 0,
+                           "args": args})
+            for start, end in [("push_wall", "wall0"), ("wall1", "wall2")]:
+                events.append({"name": "profiler",
+                               "cat": "profiler",
+                               "ph": "X",
+                               "ts": 1e6*(record[start] - self._origin),
+                               "dur": 1e6*(record[end] - record[start]),
+                               "pid": pid,
+                               "tid": 0})
+        events.sort(key=lambda event: (event["ts"], -event["dur"]))
+        with open(fname, "w") as fout:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                      fout)
+
+    def report(self, fname):
+        """Print the summary table and save the trace to ``fname``
+
+        It does nothing if the profiler is not enabled.
+        """
+        if not self.enabled:
+            return None
+        print(self.summary(), file=sys.stderr)
+        self.save_trace(fname)
+        print("Trace saved to %s" % fname, file=sys.stderr)
+        return None